@@ -1,27 +1,60 @@
 """
 Flask Backend API for Presage Heart Rate Detection
 Receives video frames from React frontend and returns real-time heart rate from Presage API
+
+Production (Linux): gunicorn -c gunicorn_conf.py app:app
+Local: python app.py (set FLASK_ENV=development for the debug server)
 """
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import base64
-import numpy as np
+from flask_compress import Compress
+from waitress import serve
+import os
+import time
+import threading
+import orjson
 import cv2
 from presage_heartbeat import PresageHeartbeatDetector
+from jpeg_codec import JPEG_BACKEND
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Log which JPEG codec OpenCV was built with and whether its SIMD paths are enabled;
+# imdecode/imencode run on every frame
+for line in cv2.getBuildInformation().splitlines():
+    if 'JPEG' in line or 'SIMD Support' in line:
+        print(f"OpenCV {line.strip()}")
+print(f"Frame JPEG codec: {JPEG_BACKEND}")
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (serializes numpy arrays/scalars natively)"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
+# gzip/br JSON responses when the client accepts it; small ones (<500 B) are left as-is
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+Compress(app)
 
 presage_detector = None
+_init_lock = threading.Lock()  # Serializes detector creation and shutdown
 
 def init_presage():
     global presage_detector
     try:
-        presage_detector = PresageHeartbeatDetector()
-        if presage_detector.start_measurement(mode="continuous"):
+        detector = PresageHeartbeatDetector()
+        started = detector.start_measurement(mode="continuous")
+        # Publish only after the start attempt so other threads never see a half-started detector
+        presage_detector = detector
+        if started:
             print("✓ Presage heartbeat detector initialized")
             return True
         return False
@@ -29,6 +62,15 @@ def init_presage():
         print(f"✗ Error initializing Presage: {e}")
         return False
 
+def ensure_presage():
+    """Initialize the detector once, even when several first requests race in"""
+    if presage_detector is not None:
+        return True
+    with _init_lock:
+        if presage_detector is not None:
+            return True
+        return init_presage()
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({
@@ -40,9 +82,8 @@ def health():
 def start_measurement():
     global presage_detector
     try:
-        if presage_detector is None:
-            if not init_presage():
-                return jsonify({'error': 'Failed to initialize Presage'}), 500
+        if not ensure_presage():
+            return jsonify({'error': 'Failed to initialize Presage'}), 500
         if presage_detector.is_measuring:
             return jsonify({'status': 'already_measuring'})
         return jsonify({'status': 'started'})
@@ -53,31 +94,29 @@ def start_measurement():
 def process_frame():
     global presage_detector
     try:
-        if presage_detector is None:
-            if not init_presage():
-                return jsonify({'heartRate': 0, 'status': 'error', 'message': 'Presage not initialized'}), 500
+        # Frame arrives as a raw JPEG body; the timestamp rides in a header.
+        # Bad input is rejected before touching Presage, so it never triggers initialization.
+        # Turn away old base64 JSON clients without reading or parsing their body.
+        if request.is_json:
+            return jsonify({'heartRate': 0, 'status': 'error', 'message': 'Send the frame as an image/jpeg body'}), 415
         
-        data = request.json
-        if not data or 'frame' not in data:
+        image_bytes = request.get_data(cache=False)
+        if not image_bytes:
             return jsonify({'heartRate': 0, 'status': 'error', 'message': 'No frame data'}), 400
         
-        image_data = data['frame']
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if not image_bytes.startswith(b'\xff\xd8'):
+            return jsonify({'heartRate': 0, 'status': 'error', 'message': 'Frame is not a JPEG image'}), 400
         
-        if frame is None:
-            return jsonify({'heartRate': 0, 'status': 'error', 'message': 'Failed to decode image'}), 400
-        
-        timestamp_ms = data.get('timestamp', None)
+        timestamp_ms = request.headers.get('X-Timestamp-Ms', type=int)
         if timestamp_ms is None:
-            import time
             timestamp_ms = int(time.time() * 1000)
         
-        presage_detector.process_frame_continuous(frame)
+        if not ensure_presage():
+            return jsonify({'heartRate': 0, 'status': 'error', 'message': 'Presage not initialized'}), 500
+        
+        # Queued for the background worker, which forwards or decodes it; respond
+        # with the last known pulse
+        presage_detector.process_frame_continuous(image_bytes, timestamp_ms, is_jpeg=True)
         heart_rate = presage_detector.get_pulse()
         
         if heart_rate > 0:
@@ -113,12 +152,10 @@ def export_heartrate_data():
     global presage_detector
     if presage_detector is None:
         return jsonify({'error': 'No data'}), 400
-    history = []
-    if hasattr(presage_detector, 'metrics_buffer'):
-        history = list(presage_detector.metrics_buffer)
+    # Columnar history: orjson writes the NumPy arrays directly
     return jsonify({
         'currentHeartRate': presage_detector.get_pulse(),
-        'history': history,
+        'history': presage_detector.get_history(),
         'isMeasuring': presage_detector.is_measuring
     })
 
@@ -126,9 +163,10 @@ def export_heartrate_data():
 def stop_measurement():
     global presage_detector
     try:
-        if presage_detector and presage_detector.is_measuring:
-            presage_detector.stop_measurement()
-            return jsonify({'status': 'stopped'})
+        with _init_lock:
+            if presage_detector and presage_detector.is_measuring:
+                presage_detector.stop_measurement()
+                return jsonify({'status': 'stopped'})
         return jsonify({'status': 'not_measuring'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -139,4 +177,8 @@ if __name__ == '__main__':
     init_presage()
     print("API: http://localhost:5000")
     print("=" * 60)
-    app.run(debug=True, port=5000, host='0.0.0.0')
+    if os.getenv('FLASK_ENV') == 'development':
+        app.run(debug=True, port=5000, host='0.0.0.0')
+    else:
+        # Thread-pool WSGI server so concurrent frame POSTs are not serialized
+        serve(app, host='0.0.0.0', port=5000, threads=8)
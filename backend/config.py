@@ -10,3 +10,14 @@ PRESAGE_API_KEY = os.getenv('PRESAGE_API_KEY')
 if not PRESAGE_API_KEY:
     raise ValueError("PRESAGE_API_KEY not found in environment variables. Please check your .env file.")
 
+
+# JPEG decode downscale factor for incoming frames (1, 2, 4 or 8).
+# libjpeg-turbo scales in the DCT domain, so larger factors skip most of the IDCT work.
+DECODE_SCALE = int(os.getenv('DECODE_SCALE', '2'))
+
+if DECODE_SCALE not in (1, 2, 4, 8):
+    raise ValueError("DECODE_SCALE must be one of 1, 2, 4 or 8.")
+
+# Forward the client's JPEG to Presage as-is (no server-side decode/re-encode).
+# Set to 0 to decode, crop to the face and re-encode instead: smaller uploads, more CPU.
+FORWARD_JPEG = os.getenv('FORWARD_JPEG', '1') == '1'
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings for the heart rate API
+Run with: gunicorn -c gunicorn_conf.py app:app
+"""
+import os
+
+bind = "0.0.0.0:5000"
+
+# The Presage session and current pulse live in the worker process, so a single
+# worker keeps frame uploads and /current polls on the same detector.
+# Threads give request concurrency and share one pooled HTTP session to Presage.
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+worker_class = "gthread"
+threads = 8
+preload_app = True
@@ -0,0 +1,75 @@
+"""
+JPEG decode/encode helpers for the frame pipeline
+Calls libjpeg-turbo directly through PyTurboJPEG when the library is installed,
+otherwise falls back to OpenCV's codecs
+"""
+from typing import Optional
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _turbo = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    # Python package or libturbojpeg shared library missing
+    _turbo = None
+
+JPEG_BACKEND = "turbojpeg" if _turbo is not None else "opencv"
+
+# OpenCV equivalents of TurboJPEG's 1/N scaling factors
+_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_jpeg(jpeg_bytes: bytes, scale: int = 1, dst: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Decode JPEG data to a BGR frame, downscaled by 1/scale in the DCT domain
+    
+    Args:
+        jpeg_bytes: JPEG image data
+        scale: Downscale factor (1, 2, 4 or 8)
+        dst: Previously decoded frame to decode into when the size matches
+            (TurboJPEG only; OpenCV always allocates)
+        
+    Returns:
+        BGR frame (dst itself when it was reused), or None if the data could not be decoded
+    """
+    if _turbo is not None:
+        scaling_factor = (1, scale) if scale > 1 else None
+        try:
+            if dst is not None:
+                try:
+                    return _turbo.decode(jpeg_bytes, pixel_format=TJPF_BGR, scaling_factor=scaling_factor, dst=dst)
+                except ValueError:
+                    # Frame size changed; fall through and allocate a new buffer
+                    pass
+            return _turbo.decode(jpeg_bytes, pixel_format=TJPF_BGR, scaling_factor=scaling_factor)
+        except OSError:
+            return None
+    return cv2.imdecode(np.frombuffer(jpeg_bytes, np.uint8), _DECODE_FLAGS[scale])
+
+
+def encode_jpeg(frame: np.ndarray, quality: int):
+    """
+    Encode a BGR frame as baseline 4:2:0 JPEG
+    
+    Args:
+        frame: OpenCV frame (BGR format)
+        quality: JPEG quality (0-100)
+        
+    Returns:
+        Encoded JPEG as bytes or a uint8 buffer, or None on failure
+    """
+    if _turbo is not None:
+        return _turbo.encode(np.ascontiguousarray(frame), quality=quality, jpeg_subsample=TJSAMP_420)
+    # Baseline (non-optimized, non-progressive) JPEG stays on libjpeg-turbo's SIMD path
+    ok, buffer = cv2.imencode('.jpg', frame, [
+        cv2.IMWRITE_JPEG_QUALITY, quality,
+        cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+        cv2.IMWRITE_JPEG_PROGRESSIVE, 0,
+    ])
+    return buffer if ok else None
@@ -0,0 +1,67 @@
+"""
+Validation helpers for vitals reported by the Presage API
+Shared by the REST client so pulse/breathing checks live in one place
+"""
+import math
+import numpy as np
+
+# Accepted ranges (inclusive)
+PULSE_RANGE = (30, 200)  # BPM
+BREATHING_RANGE = (5, 60)  # Breaths/min
+
+
+def validate_vital(raw, lo: int, hi: int) -> int:
+    """
+    Validate a single vital reading
+    
+    Args:
+        raw: Value from the API (number, numeric string or None)
+        lo: Lowest accepted value
+        hi: Highest accepted value
+        
+    Returns:
+        The reading rounded to an int, or -1 if it is missing, not finite or out of range
+    """
+    try:
+        value = float(raw)
+    except (ValueError, TypeError, OverflowError):
+        return -1
+    if not math.isfinite(value):
+        return -1
+    rounded = int(round(value))
+    return rounded if lo <= rounded <= hi else -1
+
+
+def _to_float(raw) -> float:
+    """Convert one reading to float, mapping anything unparseable to NaN"""
+    try:
+        return float(raw)
+    except (ValueError, TypeError, OverflowError):
+        return math.nan
+
+
+def validate_vitals(values, lo: int, hi: int) -> np.ndarray:
+    """
+    Validate a batch of vital readings in one vectorized pass
+    
+    Same rules as validate_vital, applied per sample: one bad element only
+    invalidates itself, not the rest of the batch.
+    
+    Args:
+        values: Flat sequence or array of readings from the API
+        lo: Lowest accepted value
+        hi: Highest accepted value
+        
+    Returns:
+        int16 array aligned with values: the rounded reading, or -1 where invalid
+    """
+    try:
+        samples = np.asarray(values, dtype=np.float64)
+        if samples.ndim != 1:
+            raise ValueError("expected a flat sequence of readings")
+    except (ValueError, TypeError, OverflowError):
+        # Mixed payload (strings, None, nested values): convert one by one
+        samples = np.fromiter((_to_float(v) for v in values), dtype=np.float64, count=len(values))
+    rounded = np.rint(samples)
+    valid = np.isfinite(rounded) & (rounded >= lo) & (rounded <= hi)
+    return np.where(valid, rounded, -1).astype(np.int16)
@@ -5,13 +5,16 @@ Uses Presage's official REST API for accurate heartbeat/pulse detection
 import cv2
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import base64
 import time
 import json
 from typing import Optional, Dict, Any, Callable
-from config import PRESAGE_API_KEY
+from config import PRESAGE_API_KEY, DECODE_SCALE, FORWARD_JPEG
+from jpeg_codec import decode_jpeg, encode_jpeg
+from metrics_fast import validate_vital, validate_vitals, PULSE_RANGE, BREATHING_RANGE
 import threading
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 class PresageHeartbeatDetector:
     """
@@ -26,6 +29,11 @@ class PresageHeartbeatDetector:
     3. Receives real-time metrics (pulse, breathing, etc.)
     """
     
+    # Shared Haar cascade for cropping frames to the face before upload
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    face_detect_interval = 15  # Re-run face detection every N frames
+    face_margin = 0.15  # Padding around the detected face (fraction of its size)
+    
     def __init__(self, api_key: str = None):
         """
         Initialize Presage heartbeat detector
@@ -47,18 +55,62 @@ class PresageHeartbeatDetector:
             "X-API-Key": self.api_key  # Alternative auth method
         }
         
+        # Persistent HTTP session so every call reuses a kept-alive TLS connection
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+        self.session.mount("https://", adapter)
+        
+        self.jpeg_quality = 70  # Quality for frames re-encoded after the face crop
+        
+        # Client JPEGs are forwarded as-is unless FORWARD_JPEG is off, in which case
+        # the worker decodes them (at 1/decode_scale) for the face crop
+        self.forward_jpeg = FORWARD_JPEG
+        self.decode_scale = DECODE_SCALE
+        self._decode_scratch = None  # Last decoded frame, reused as the next decode target
+        
+        # Frames go up as raw JPEG; endpoints that answered 415 get base64 JSON instead
+        self._json_frame_endpoints = set()
+        
+        # Position in the session's rolling pulse buffer, so each poll only stores new samples
+        self._last_pulse_batch = np.empty(0, dtype=np.int16)  # Last untimestamped batch, validated
+        self._last_pulse_sample_ms = -1  # Timestamp of the newest sample already stored
+        
         # Session management
         self.session_id = None
+        
+        # Probes candidate endpoints concurrently (one thread per candidate)
+        self._probe_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="presage-probe")
+        
+        # Endpoints that last answered successfully, tried first on later calls
+        self._session_endpoint = None
+        self._frame_endpoint = None
+        self._metrics_endpoint = None
         self.is_measuring = False
         self.metrics_callback = None
         
         # Current metrics
         self.current_pulse = 0
         self.current_breathing_rate = 0
-        self.metrics_buffer = deque(maxlen=100)
         
-        # Frame processing
-        self.frame_queue = deque(maxlen=30)  # Buffer frames
+        # Metrics history: ring buffer of parallel arrays (no per-sample objects)
+        self.history_size = 100
+        self.history_timestamps = np.zeros(self.history_size, dtype=np.int64)
+        self.history_pulse = np.zeros(self.history_size, dtype=np.int16)
+        self.history_breathing = np.zeros(self.history_size, dtype=np.int16)
+        self.history_count = 0  # Total samples written; next slot is count % size
+        self.history_lock = threading.Lock()
+        
+        # Face ROI cache (x, y, w, h), refreshed every face_detect_interval frames
+        # (also while no face is found); starts due so the first frame detects
+        self.face_bbox = None
+        self.frames_since_detect = self.face_detect_interval
+        
+        # Frame processing: handlers overwrite a latest-frame slot, a background
+        # worker picks up the newest frame at the Presage upload rate
+        self.frame_rate = 6  # Frames/sec sent to Presage
+        self._latest = None  # (frame, timestamp_ms) or None
+        self._latest_lock = threading.Lock()
         self.processing_thread = None
         self.stop_processing = False
         
@@ -87,30 +139,31 @@ class PresageHeartbeatDetector:
                 f"https://api.physiology.presagetech.com/v1/sessions"
             ]
             
-            session_id = None
-            for endpoint in endpoints_to_try:
-                try:
-                    # Use 2 second timeout to prevent hanging
-                    response = requests.post(
-                        endpoint,
-                        headers=self.headers,
-                        json=session_data,
-                        timeout=2  # SHORT timeout
-                    )
-                    if response.status_code == 200 or response.status_code == 201:
-                        data = response.json()
-                        session_id = data.get("session_id") or data.get("id") or data.get("sessionId")
-                        if session_id:
-                            print(f"SUCCESS: Presage session started")
-                            self.session_id = session_id
-                            self.is_measuring = True
-                            return True
-                except requests.exceptions.Timeout:
-                    # Timeout - skip this endpoint, try next
-                    continue
-                except requests.exceptions.RequestException:
-                    # Other errors - try next endpoint
-                    continue
+            def post_session(endpoint):
+                # Use 2 second timeout to prevent hanging
+                return self.session.post(endpoint, json=session_data, timeout=2)
+            
+            # All candidates are tried at once; the first one returning a session id wins
+            endpoint, response = self._call_endpoints(
+                post_session,
+                endpoints_to_try,
+                timeout=2.5,
+                is_ok=lambda response: self._session_id_from(response) is not None,
+                # Other candidates may have created sessions too; close those
+                on_discard=lambda endpoint, response: self._delete_session(endpoint, self._session_id_from(response))
+            )
+            if response is not None:
+                print(f"SUCCESS: Presage session started")
+                self.session_id = self._session_id_from(response)
+                self._session_endpoint = endpoint
+                self._frame_endpoint = None
+                self._metrics_endpoint = None
+                self._json_frame_endpoints = set()
+                self._last_pulse_batch = np.empty(0, dtype=np.int16)
+                self._last_pulse_sample_ms = -1
+                self.is_measuring = True
+                self._start_worker()
+                return True
             
             # If REST API doesn't work, silently return False (will use local detection)
             return False
@@ -124,7 +177,8 @@ class PresageHeartbeatDetector:
         Send a video frame to Presage API for processing
         
         Args:
-            frame: OpenCV frame (BGR format)
+            frame: OpenCV frame (BGR format), already downscaled by
+                decode_scale when the worker decoded it from client JPEG
             timestamp_ms: Timestamp in milliseconds
             
         Returns:
@@ -136,48 +190,130 @@ class PresageHeartbeatDetector:
         try:
             timestamp_ms = timestamp_ms or int(time.time() * 1000)
             
-            # Encode frame to JPEG
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
+            # Only the face matters for rPPG; crop so fewer pixels are encoded and sent
+            frame = self._crop_to_face(frame)
             
-            # Send frame to Presage API
-            frame_data = {
-                "frame": frame_base64,
-                "timestamp": timestamp_ms,
-                "format": "jpg"
-            }
+            # Encode frame to JPEG (cost scales with the decoded frame size)
+            jpeg = encode_jpeg(frame, self.jpeg_quality)
+            if jpeg is None:
+                return None
+            return self.send_jpeg_bytes(jpeg, timestamp_ms)
             
-            # Try different endpoint patterns
-            endpoints_to_try = [
+        except Exception as e:
+            # Silently fail - will use local detection
+            return None
+    
+    def send_jpeg_bytes(self, jpeg_bytes: bytes, timestamp_ms: int = None) -> Optional[Dict]:
+        """
+        Send an already JPEG-encoded frame to Presage API for processing
+        
+        Skips the decode/re-encode round trip when the client already sent JPEG.
+        
+        Args:
+            jpeg_bytes: JPEG image data
+            timestamp_ms: Timestamp in milliseconds
+            
+        Returns:
+            Dictionary with metrics or None
+        """
+        if not self.session_id:
+            return None
+        
+        try:
+            timestamp_ms = timestamp_ms or int(time.time() * 1000)
+            
+            def post_frame(endpoint):
+                binary = endpoint not in self._json_frame_endpoints
+                body, headers = self._frame_body(jpeg_bytes, timestamp_ms, binary)
+                response = self.session.post(endpoint, data=body, headers=headers, timeout=5)
+                if response.status_code == 415 and binary:
+                    # This endpoint wants base64 JSON; remember that for it alone
+                    self._json_frame_endpoints.add(endpoint)
+                    body, headers = self._frame_body(jpeg_bytes, timestamp_ms, binary=False)
+                    response = self.session.post(endpoint, data=body, headers=headers, timeout=5)
+                return response
+            
+            # Try different endpoint patterns, last working one first
+            endpoint, response = self._call_endpoints(post_frame, [
                 f"{self.api_base_url}/sessions/{self.session_id}/frames",
                 f"{self.api_base_url}/sessions/{self.session_id}/video",
                 f"{self.api_base_url}/measurements/{self.session_id}/frames"
-            ]
+            ], cached=self._frame_endpoint, timeout=5.5)
             
-            for endpoint in endpoints_to_try:
-                try:
-                    response = requests.post(
-                        endpoint,
-                        headers=self.headers,
-                        json=frame_data,
-                        timeout=5
-                    )
-                    
-                    if response.status_code == 200:
-                        return response.json()
-                except requests.exceptions.RequestException:
-                    continue
-            
-            return None
+            if response is None:
+                return None
+            self._frame_endpoint = endpoint
+            return response.json()
             
         except Exception as e:
             # Silently fail - will use local detection
             return None
     
-    def get_metrics(self) -> Optional[Dict]:
+    @staticmethod
+    def _frame_body(jpeg_bytes: bytes, timestamp_ms: int, binary: bool = True) -> tuple:
+        """
+        Build the request body and headers for a frame upload
+        
+        Args:
+            jpeg_bytes: JPEG image data (bytes or encoded numpy buffer)
+            timestamp_ms: Timestamp in milliseconds
+            binary: Raw image/jpeg body if True, else base64 JSON
+            
+        Returns:
+            (body, headers) tuple for session.post
+        """
+        if binary:
+            # Raw JPEG body, metadata in headers: no base64 inflation, no JSON encode
+            body = jpeg_bytes if isinstance(jpeg_bytes, bytes) else jpeg_bytes.tobytes()
+            return body, {"Content-Type": "image/jpeg", "X-Timestamp-Ms": str(timestamp_ms)}
+        
+        # Legacy base64 JSON body, assembled as bytes to skip json.dumps and str copies
+        body = b"".join((
+            b'{"frame":"',
+            base64.b64encode(memoryview(jpeg_bytes)),
+            b'","timestamp":%d,"format":"jpg"}' % timestamp_ms,
+        ))
+        return body, {"Content-Type": "application/json"}
+    
+    def _crop_to_face(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Crop frame to the cached face bounding box
+        
+        Args:
+            frame: OpenCV frame (BGR format)
+            
+        Returns:
+            Face region with margin, or the full frame if the last detection found none
+        """
+        if self.frames_since_detect >= self.face_detect_interval:
+            self.frames_since_detect = 0
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40))
+            if len(faces) > 0:
+                # Keep the largest face
+                x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+                pad_x = int(w * self.face_margin)
+                pad_y = int(h * self.face_margin)
+                x0, y0 = max(x - pad_x, 0), max(y - pad_y, 0)
+                x1, y1 = min(x + w + pad_x, frame.shape[1]), min(y + h + pad_y, frame.shape[0])
+                self.face_bbox = (x0, y0, x1 - x0, y1 - y0)
+            else:
+                self.face_bbox = None
+        self.frames_since_detect += 1
+        
+        if self.face_bbox is None:
+            return frame
+        x, y, w, h = self.face_bbox
+        return frame[y:y + h, x:x + w]
+    
+    def get_metrics(self, timestamp_ms: int = None) -> Optional[Dict]:
         """
         Get current metrics from Presage API
         
+        Args:
+            timestamp_ms: Client timestamp of the latest frame, used for new batch
+                samples that carry no timestamp of their own
+        
         Returns:
             Dictionary with pulse, breathing, and other metrics
         """
@@ -185,136 +321,173 @@ class PresageHeartbeatDetector:
             return None
         
         try:
-            # Try different endpoint patterns
-            endpoints_to_try = [
+            # Try different endpoint patterns, last working one first
+            endpoint, response = self._call_endpoints(lambda endpoint: self.session.get(endpoint, timeout=5), [
                 f"{self.api_base_url}/sessions/{self.session_id}/metrics",
                 f"{self.api_base_url}/measurements/{self.session_id}",
                 f"{self.api_base_url}/sessions/{self.session_id}/results"
-            ]
+            ], cached=self._metrics_endpoint, timeout=5.5)
             
-            for endpoint in endpoints_to_try:
-                try:
-                    response = requests.get(
-                        endpoint,
-                        headers=self.headers,
-                        timeout=5
-                    )
-                    
-                    if response.status_code == 200:
-                        metrics = response.json()
-                        
-                        # Parse Presage metrics format
-                        # Based on their MetricsBuffer structure
-                        pulse = None
-                        breathing = None
-                        
-                        if "pulse" in metrics:
-                            pulse_data = metrics["pulse"]
-                            if isinstance(pulse_data, dict):
-                                pulse = pulse_data.get("value") or pulse_data.get("strict") or pulse_data.get("bpm")
-                            else:
-                                pulse = pulse_data
-                        
-                        if "breathing" in metrics:
-                            breathing_data = metrics["breathing"]
-                            if isinstance(breathing_data, dict):
-                                breathing = breathing_data.get("value") or breathing_data.get("strict") or breathing_data.get("bpm")
-                            else:
-                                breathing = breathing_data
-                        
-                        result = {
-                            "pulse": pulse,
-                            "breathing_rate": breathing,
-                            "timestamp": time.time(),
-                            "raw_metrics": metrics
-                        }
-                        
-                        # Update current values with robust validation (like Presage does)
-                        if pulse is not None:
-                            try:
-                                # Validate and convert pulse value
-                                pulse_float = float(pulse)
-                                if not (np.isnan(pulse_float) or np.isinf(pulse_float)):
-                                    pulse_int = int(round(pulse_float))
-                                    # Validate range (30-200 BPM)
-                                    if 30 <= pulse_int <= 200:
-                                        self.current_pulse = pulse_int
-                            except (ValueError, TypeError, OverflowError):
-                                # Invalid value, don't update
-                                pass
-                        
-                        if breathing is not None:
-                            try:
-                                # Validate and convert breathing value
-                                breathing_float = float(breathing)
-                                if not (np.isnan(breathing_float) or np.isinf(breathing_float)):
-                                    breathing_int = int(round(breathing_float))
-                                    # Validate range (5-60 breaths/min)
-                                    if 5 <= breathing_int <= 60:
-                                        self.current_breathing_rate = breathing_int
-                            except (ValueError, TypeError, OverflowError):
-                                # Invalid value, don't update
-                                pass
-                        
-                        return result
-                        
-                except requests.exceptions.RequestException:
-                    continue
+            if response is None:
+                return None
+            self._metrics_endpoint = endpoint
+            metrics = response.json()
             
-            return None
+            # Parse Presage metrics format
+            # Based on their MetricsBuffer structure
+            pulse = None
+            breathing = None
+            
+            if "pulse" in metrics:
+                pulse_data = metrics["pulse"]
+                if isinstance(pulse_data, dict):
+                    pulse = pulse_data.get("value") or pulse_data.get("strict") or pulse_data.get("bpm")
+                else:
+                    pulse = pulse_data
+            
+            if "breathing" in metrics:
+                breathing_data = metrics["breathing"]
+                if isinstance(breathing_data, dict):
+                    breathing = breathing_data.get("value") or breathing_data.get("strict") or breathing_data.get("bpm")
+                else:
+                    breathing = breathing_data
+            
+            result = {
+                "pulse": pulse,
+                "breathing_rate": breathing,
+                "timestamp": time.time(),
+                "raw_metrics": metrics,
+                "pulse_samples": None
+            }
+            
+            # Update current values with robust validation (like Presage does)
+            if isinstance(breathing, (list, tuple)):
+                breathing_samples = validate_vitals(breathing, *BREATHING_RANGE)
+                breathing_samples = breathing_samples[breathing_samples >= 0]
+                if len(breathing_samples):
+                    self.current_breathing_rate = int(breathing_samples[-1])
+            else:
+                breathing_int = validate_vital(breathing, *BREATHING_RANGE)
+                if breathing_int >= 0:
+                    self.current_breathing_rate = breathing_int
+            
+            if isinstance(pulse, (list, tuple)):
+                # Burst of samples: validate all at once, then store only the ones
+                # not seen on earlier polls
+                if timestamp_ms is None:
+                    timestamp_ms = int(time.time() * 1000)
+                values, sample_times = self._split_pulse_samples(pulse)
+                pulse_samples = validate_vitals(values, *PULSE_RANGE)
+                valid = pulse_samples[pulse_samples >= 0]
+                result["pulse_samples"] = valid
+                if len(valid):
+                    self.current_pulse = int(valid[-1])
+                new_samples, new_times = self._unseen_pulse_samples(pulse_samples, sample_times, timestamp_ms)
+                keep = new_samples >= 0
+                if keep.any():
+                    self._record_history_batch(new_times[keep], new_samples[keep])
+            else:
+                pulse_int = validate_vital(pulse, *PULSE_RANGE)
+                if pulse_int >= 0:
+                    self.current_pulse = pulse_int
+            
+            return result
             
         except Exception as e:
             return None
     
-    def process_frame_continuous(self, frame: np.ndarray):
+    def process_frame_continuous(self, frame_or_jpeg, timestamp_ms: int = None, is_jpeg: bool = False):
         """
         Process frame in continuous mode (async)
         
+        Hands the frame to the background worker and returns immediately;
+        read the latest result with get_pulse(). Frames the worker has not
+        picked up yet are replaced, so only the newest one is sent.
+        
         Args:
-            frame: Video frame to process
+            frame_or_jpeg: Video frame (BGR ndarray), or JPEG bytes if is_jpeg
+            timestamp_ms: Capture timestamp in milliseconds
+            is_jpeg: Frame is JPEG bytes; sent as-is, or decoded and cropped
+                by the worker when forward_jpeg is off
         """
         if not self.is_measuring or not self.session_id:
             return
         
+        item = (frame_or_jpeg, timestamp_ms or int(time.time() * 1000), is_jpeg)
+        with self._latest_lock:
+            self._latest = item
+    
+    def _start_worker(self):
+        """Start the background frame worker if it is not already running"""
+        self.stop_processing = False
+        if self.processing_thread is None or not self.processing_thread.is_alive():
+            self.processing_thread = threading.Thread(target=self._worker, daemon=True)
+            self.processing_thread.start()
+    
+    def _worker(self):
+        """Send the newest frame to Presage and refresh metrics off the request thread"""
+        interval = 1.0 / self.frame_rate
+        while not self.stop_processing:
+            started = time.monotonic()
+            with self._latest_lock:
+                item, self._latest = self._latest, None
+            
+            if item is not None:
+                self._process_frame(*item)
+            
+            # Pace uploads to the Presage frame rate
+            elapsed = time.monotonic() - started
+            if elapsed < interval:
+                time.sleep(interval - elapsed)
+    
+    def _process_frame(self, frame_or_jpeg, timestamp_ms: int, is_jpeg: bool):
+        """
+        Send one frame to Presage and update current metrics
+        
+        Args:
+            frame_or_jpeg: OpenCV frame (BGR format), or JPEG bytes if is_jpeg
+            timestamp_ms: Capture timestamp in milliseconds
+            is_jpeg: Whether frame_or_jpeg is already JPEG-encoded
+        """
         try:
-            # Add to queue for processing
-            timestamp_ms = int(time.time() * 1000)
-            self.frame_queue.append((frame, timestamp_ms))
+            if is_jpeg and not self.forward_jpeg:
+                # Decoding here rather than on the request thread means only the worker
+                # touches the scratch frame, so it can be reused frame after frame
+                frame = decode_jpeg(frame_or_jpeg, self.decode_scale, dst=self._decode_scratch)
+                if frame is None:
+                    return
+                self._decode_scratch = frame
+                frame_or_jpeg, is_jpeg = frame, False
             
-            # Process every 5 frames (to reduce API calls and rate limiting)
-            if len(self.frame_queue) >= 5:
-                frame_to_send, timestamp = self.frame_queue.popleft()
+            # Send frame to Presage API (JPEG bytes skip the re-encode)
+            if is_jpeg:
+                metrics = self.send_jpeg_bytes(frame_or_jpeg, timestamp_ms)
+            else:
+                metrics = self.send_frame(frame_or_jpeg, timestamp_ms)
+            
+            # Update metrics if received
+            if metrics:
+                if self.metrics_callback:
+                    self.metrics_callback(metrics)
                 
-                # Send frame to Presage API
-                metrics = self.send_frame(frame_to_send, timestamp)
+                # Parse pulse from response with robust validation
+                pulse_value = metrics.get("pulse") if isinstance(metrics, dict) else None
+                pulse_int = validate_vital(pulse_value, *PULSE_RANGE)
+                if pulse_int >= 0:
+                    self.current_pulse = pulse_int
                 
-                # Update metrics if received
-                if metrics:
+                # Also try to get metrics directly
+                direct_metrics = self.get_metrics(timestamp_ms)
+                if direct_metrics:
                     if self.metrics_callback:
-                        self.metrics_callback(metrics)
-                    
-                    # Parse pulse from response with robust validation
-                    if "pulse" in metrics:
-                        pulse_value = metrics["pulse"]
-                        if pulse_value is not None:
-                            try:
-                                pulse_float = float(pulse_value)
-                                if not (np.isnan(pulse_float) or np.isinf(pulse_float)):
-                                    pulse_int = int(round(pulse_float))
-                                    # Validate range (30-200 BPM)
-                                    if 30 <= pulse_int <= 200:
-                                        self.current_pulse = pulse_int
-                            except (ValueError, TypeError, OverflowError):
-                                # Invalid value, don't update
-                                pass
-                    
-                    # Also try to get metrics directly
-                    direct_metrics = self.get_metrics()
-                    if direct_metrics:
-                        if self.metrics_callback:
-                            self.metrics_callback(direct_metrics)
+                        self.metrics_callback(direct_metrics)
+                
+                # Batched samples were already stored by get_metrics
+                batched = direct_metrics is not None and direct_metrics["pulse_samples"] is not None
+                if self.current_pulse > 0 and not batched:
+                    self._record_history(timestamp_ms)
         except Exception as e:
-            # Silently handle errors - don't crash
+            # Silently handle errors - keep the worker alive
             pass
     
     def stop_measurement(self):
@@ -324,15 +497,16 @@ class PresageHeartbeatDetector:
         
         if self.session_id:
             try:
-                # End session
-                endpoints_to_try = [
+                # End session, starting with the endpoint that created it
+                session_endpoint = f"{self._session_endpoint}/{self.session_id}" if self._session_endpoint else None
+                endpoints_to_try = self._prefer_endpoint(session_endpoint, [
                     f"{self.api_base_url}/sessions/{self.session_id}",
                     f"{self.api_base_url}/measurements/{self.session_id}"
-                ]
+                ])
                 
                 for endpoint in endpoints_to_try:
                     try:
-                        requests.delete(endpoint, headers=self.headers, timeout=5)
+                        self.session.delete(endpoint, timeout=5)
                         break
                     except:
                         continue
@@ -341,6 +515,196 @@ class PresageHeartbeatDetector:
             
             self.session_id = None
     
+    def _call_endpoints(self, send: Callable, endpoints: list, cached: Optional[str] = None,
+                        timeout: float = 5, is_ok: Optional[Callable] = None,
+                        on_discard: Optional[Callable] = None) -> tuple:
+        """
+        Call the last working endpoint, or probe all candidates concurrently
+        
+        Args:
+            send: Function taking an endpoint URL and returning a requests.Response
+            endpoints: Candidate endpoint URLs
+            cached: Endpoint that worked last time, tried on its own first
+            timeout: Seconds to wait for the concurrent probe
+            is_ok: Predicate for an acceptable response (default: HTTP 200)
+            on_discard: Called with (endpoint, response) for every other acceptable
+                response, including ones that arrive after this returns
+            
+        Returns:
+            (endpoint, response) for the first acceptable response, or (None, None)
+        """
+        is_ok = is_ok or (lambda response: response.status_code == 200)
+        
+        if cached:
+            try:
+                response = send(cached)
+                if is_ok(response):
+                    return cached, response
+            except requests.exceptions.RequestException:
+                pass
+            endpoints = [endpoint for endpoint in endpoints if endpoint != cached]
+        
+        # Candidates run in parallel, so a failed probe costs one RTT instead of the sum of all
+        futures = {self._probe_pool.submit(send, endpoint): endpoint for endpoint in endpoints}
+        winner = None
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    response = future.result()
+                except requests.exceptions.RequestException:
+                    continue
+                if is_ok(response):
+                    winner = future
+                    return futures[future], response
+        except FuturesTimeoutError:
+            pass
+        finally:
+            for future, endpoint in futures.items():
+                # Drop probes that have not started yet; hand the rest to on_discard
+                if future is winner or future.cancel() or on_discard is None:
+                    continue
+                future.add_done_callback(
+                    lambda future, endpoint=endpoint: self._discard_response(future, endpoint, is_ok, on_discard)
+                )
+        return None, None
+    
+    @staticmethod
+    def _discard_response(future, endpoint: str, is_ok: Callable, on_discard: Callable):
+        """Pass a losing probe's response to on_discard if it was acceptable"""
+        try:
+            response = future.result()
+            if is_ok(response):
+                on_discard(endpoint, response)
+        except Exception:
+            pass
+    
+    def _delete_session(self, endpoint: str, session_id: str):
+        """End a session created by a probe that lost the race"""
+        try:
+            self.session.delete(f"{endpoint}/{session_id}", timeout=5)
+        except requests.exceptions.RequestException:
+            pass
+    
+    @staticmethod
+    def _session_id_from(response) -> Optional[str]:
+        """Extract the session id from a session-creation response, if present"""
+        if response.status_code not in (200, 201):
+            return None
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        return data.get("session_id") or data.get("id") or data.get("sessionId")
+    
+    @staticmethod
+    def _prefer_endpoint(cached: Optional[str], endpoints: list) -> list:
+        """Move the last working endpoint to the front of the candidate list"""
+        if not cached:
+            return endpoints
+        return [cached] + [endpoint for endpoint in endpoints if endpoint != cached]
+    
+    def _record_history(self, timestamp_ms: int):
+        """Append the current pulse/breathing values to the history ring buffer"""
+        with self.history_lock:
+            i = self.history_count % self.history_size
+            self.history_timestamps[i] = timestamp_ms
+            self.history_pulse[i] = self.current_pulse
+            self.history_breathing[i] = self.current_breathing_rate
+            self.history_count += 1
+    
+    @staticmethod
+    def _split_pulse_samples(samples: list) -> tuple:
+        """
+        Split a pulse batch into readings and, when every sample has one, timestamps
+        
+        Samples are either plain readings or dicts with "value" and "timestamp" (ms).
+        
+        Returns:
+            (readings, int64 timestamps array or None)
+        """
+        if not samples or not all(isinstance(s, dict) for s in samples):
+            return samples, None
+        values = [s.get("value") for s in samples]
+        try:
+            return values, np.asarray([s.get("timestamp") for s in samples], dtype=np.int64)
+        except (ValueError, TypeError, OverflowError):
+            return values, None
+    
+    def _unseen_pulse_samples(self, samples: np.ndarray, times: Optional[np.ndarray],
+                              timestamp_ms: int) -> tuple:
+        """
+        Pick out the samples of a rolling pulse buffer not returned by earlier polls
+        
+        Timestamped samples are new when newer than the last one stored. Without
+        timestamps, the longest tail of the previous batch that starts this one is
+        skipped (all of the previous batch if the buffer grew, part of it if the
+        window slid, none if it is a fresh window), and the new samples are spread
+        evenly between the previous stored sample and timestamp_ms.
+        
+        Args:
+            samples: Validated batch from validate_vitals (-1 where invalid)
+            times: Per-sample timestamps (ms), or None
+            timestamp_ms: Client timestamp of the latest frame
+            
+        Returns:
+            (new samples, int64 array of their timestamps)
+        """
+        if times is not None:
+            new = times > self._last_pulse_sample_ms
+            if new.any():
+                self._last_pulse_sample_ms = int(times[new].max())
+            return samples[new], times[new]
+        
+        previous = self._last_pulse_batch
+        self._last_pulse_batch = samples
+        overlap = next((k for k in range(min(len(previous), len(samples)), 0, -1)
+                        if np.array_equal(previous[-k:], samples[:k])), 0)
+        new_samples = samples[overlap:]
+        if not len(new_samples):
+            return new_samples, np.empty(0, dtype=np.int64)
+        
+        # First poll (or clock went backwards): assume one sample per frame interval
+        start = self._last_pulse_sample_ms
+        if not 0 <= start < timestamp_ms:
+            start = timestamp_ms - len(new_samples) * 1000 / self.frame_rate
+        self._last_pulse_sample_ms = timestamp_ms
+        new_times = np.linspace(start, timestamp_ms, len(new_samples) + 1)[1:]
+        return new_samples, new_times.astype(np.int64)
+    
+    def _record_history_batch(self, timestamps: np.ndarray, pulse_samples: np.ndarray):
+        """Append a batch of validated pulse samples and their timestamps to the history ring buffer"""
+        timestamps = timestamps[-self.history_size:]
+        pulse_samples = pulse_samples[-self.history_size:]
+        with self.history_lock:
+            slots = (self.history_count + np.arange(len(pulse_samples))) % self.history_size
+            self.history_timestamps[slots] = timestamps
+            self.history_pulse[slots] = pulse_samples
+            self.history_breathing[slots] = self.current_breathing_rate
+            self.history_count += len(pulse_samples)
+    
+    def get_history(self) -> Dict[str, np.ndarray]:
+        """
+        Get recorded metrics history, oldest sample first
+        
+        Returns:
+            Dictionary of parallel arrays: timestamp (ms), heartRate, breathingRate
+        """
+        with self.history_lock:
+            columns = (self.history_timestamps, self.history_pulse, self.history_breathing)
+            if self.history_count <= self.history_size:
+                columns = [a[:self.history_count].copy() for a in columns]
+            else:
+                # Buffer has wrapped: the oldest sample sits at the next write slot
+                i = self.history_count % self.history_size
+                columns = [np.concatenate((a[i:], a[:i])) for a in columns]
+        return {
+            "timestamp": columns[0],
+            "heartRate": columns[1],
+            "breathingRate": columns[2]
+        }
+    
     def get_pulse(self) -> int:
         """Get current pulse rate in BPM"""
         return self.current_pulse
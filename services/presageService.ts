@@ -25,13 +25,19 @@ export const startPresageMeasurement = async (): Promise<boolean> => {
   } catch (error) { return false; }
 };
 
+// Decode the base64 JPEG natively so the frame goes over the wire as raw bytes
+const toJpegBlob = async (base64Image: string): Promise<Blob> => {
+  const dataUrl = base64Image.startsWith('data:') ? base64Image : `data:image/jpeg;base64,${base64Image}`;
+  return (await fetch(dataUrl)).blob();
+};
+
 export const processFrameForHeartRate = async (base64Image: string, timestamp?: number): Promise<number> => {
   if (!isMeasuring) await startPresageMeasurement();
   try {
     const response = await fetch(`${BACKEND_API_URL}/frame`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ frame: base64Image, timestamp: timestamp || Date.now() }),
+      headers: { 'Content-Type': 'image/jpeg', 'X-Timestamp-Ms': String(timestamp || Date.now()) },
+      body: await toJpegBlob(base64Image),
     });
     if (response.ok) {
       const data = await response.json();
@@ -63,7 +69,10 @@ export const exportHeartRateData = async (): Promise<HeartRateData[]> => {
     const response = await fetch(`${BACKEND_API_URL}/export`);
     if (response.ok) {
       const data = await response.json();
-      return data.history || heartRateHistory;
+      if (!data.history) return heartRateHistory;
+      // History arrives columnar: parallel timestamp / heartRate arrays
+      const { timestamp = [], heartRate = [] } = data.history;
+      return heartRate.map((hr: number, i: number): HeartRateData => ({ heartRate: hr, timestamp: timestamp[i], status: 'success' }));
     }
     return heartRateHistory;
   } catch (error) { return heartRateHistory; }